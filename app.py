@@ -1,17 +1,44 @@
-﻿from flask import Flask, jsonify, request, send_from_directory, send_file
+﻿from flask import Flask, jsonify, request, send_from_directory, send_file, make_response
 from flask_cors import CORS
-from functools import wraps
+from functools import wraps, lru_cache
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
 import io
 import uuid
 import json
+import zlib
+import hashlib
+import mmap
 from pathlib import Path
 from datetime import datetime
 import base64
 import re
 import zipfile
 import traceback
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared HTTP session so outbound API calls reuse keep-alive connections
+http_session = requests.Session()
+# Connection failures are retried (the request never reached the server); timed-out reads are not, so the
+# read timeout stays the worst case. 429 is never retried: re-sending would only deepen the throttling,
+# and a 503's Retry-After is ignored so a gateway error never stalls a request for the server's full delay.
+# Gateway errors that exhaust their retries come back as the last response, not a RetryError, so the
+# caller's non-200 branch (and its failure cache) still applies.
+http_session.mount('https://', HTTPAdapter(
+    max_retries=Retry(
+        total=3,
+        connect=3,
+        read=0,
+        backoff_factor=0.5,
+        status_forcelist=[502, 503, 504],
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+))
 
 # Salesforce session validation cache (sid -> {valid: bool, expires: timestamp})
 sf_session_cache = {}
@@ -50,18 +77,17 @@ def validate_salesforce_session(sid, instance_url=None):
     # Call Salesforce to validate the session
     try:
         # Use the UserInfo endpoint to validate session
-        response = requests.get(
+        response = http_session.get(
             f"{base_url}/services/oauth2/userinfo",
             headers={'Authorization': f'Bearer {sid}'},
-            timeout=10
+            timeout=(3, 10)  # (connect, read): fail fast when Salesforce is unreachable
         )
 
         if response.status_code == 200:
-            # Valid session - cache it
+            # Valid session - cache it. Only the status matters; the userinfo body is never read.
             sf_session_cache[sid] = {
                 'valid': True,
-                'expires': datetime.utcnow().timestamp() + SF_SESSION_CACHE_TTL,
-                'user_info': response.json()
+                'expires': datetime.utcnow().timestamp() + SF_SESSION_CACHE_TTL
             }
             return True, None
         else:
@@ -160,7 +186,21 @@ MASTER_TEMPLATE_CONFIG = {
         "display_name": "ACORD 140 - Evidence of Commercial Property Insurance",
     },
 }
-LOCAL_TEMPLATE_FILES = {key: value["filename"] for key, value in MASTER_TEMPLATE_CONFIG.items()}
+# Read-only template_type -> filename lookup; keys are already lower-case template types.
+LOCAL_TEMPLATE_FILES = MappingProxyType({key: value["filename"] for key, value in MASTER_TEMPLATE_CONFIG.items()})
+
+# Upper bound on local template files read concurrently during a bulk refresh
+TEMPLATE_REFRESH_MAX_WORKERS = 6
+
+# Form fields extracted from master template PDFs (template_type -> (sha256, fields)).
+# The ACORD layouts are fixed, so extraction is only repeated when the PDF bytes change.
+MASTER_TEMPLATE_FIELD_CACHE = {}
+
+# SHA-256 of bundled template PDFs (path -> (mtime_ns, size, sha256)), so unchanged files are not re-hashed.
+LOCAL_TEMPLATE_DIGEST_CACHE = {}
+
+# Directory listing of LOCAL_TEMPLATE_DIR, rebuilt only when the directory's mtime changes.
+LOCAL_TEMPLATE_DIR_INDEX = {'mtime_ns': None, 'files': {}}
 
 # Standard Certificate Holder field mapping (used as default for most templates)
 DEFAULT_CERTIFICATE_HOLDER_FIELDS = {
@@ -391,7 +431,7 @@ def save_field_mapping_to_db(template_key, scope, fields, updated_by=None):
                 updated_by = EXCLUDED.updated_by,
                 updated_at = NOW()
             ''',
-            (normalized_key, scope, Json(fields), updated_by)
+            (normalized_key, scope, Json(fields, dumps=dumps_json), updated_by)
         )
         conn.commit()
     finally:
@@ -461,6 +501,18 @@ US_STATE_OPTIONS = [
 EMAIL_REGEX = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 ACCOUNT_ID_REGEX = re.compile(r"^[A-Za-z0-9]{15}(?:[A-Za-z0-9]{3})?$")
 
+# Byte-level patterns for reading AcroForm field dictionaries from uncompressed PDF objects
+PDF_OBJECT_REGEX = re.compile(rb"\d+\s+\d+\s+obj\b(.*?)\bendobj", re.S)
+PDF_NESTED_DICT_REGEX = re.compile(rb"<<(?:(?!<<|>>).)*>>", re.S)
+PDF_FIELD_NAME_REGEX = re.compile(rb"/T\s*\(((?:\\.|[^\\)])*)\)", re.S)
+PDF_FIELD_LABEL_REGEX = re.compile(rb"/TU\s*\(((?:\\.|[^\\)])*)\)", re.S)
+PDF_FIELD_TYPE_REGEX = re.compile(rb"/FT\s*/(\w+)")
+PDF_FIELD_FLAGS_REGEX = re.compile(rb"/Ff\s+(\d+)")
+PDF_FIELD_VALUE_REGEX = re.compile(rb"/V\s*(?:\(((?:\\.|[^\\)])*)\)|/(\w+))", re.S)
+PDF_FIELD_RECT_REGEX = re.compile(rb"/Rect\s*\[([-+\d.\s]+)\]")
+PDF_STRING_ESCAPE_REGEX = re.compile(rb"\\([0-7]{1,3}|\r\n|.)", re.S)
+PDF_STRING_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
 try:
     from supabase import create_client, Client
     SUPABASE_AVAILABLE = True
@@ -479,14 +531,43 @@ except ImportError:
 try:
     import fitz  # PyMuPDF
     PYMUPDF_AVAILABLE = True
+    # Widget type -> AcroForm /FT, so PyMuPDF reports the same types pypdf does
+    PYMUPDF_FIELD_TYPES = {
+        fitz.PDF_WIDGET_TYPE_TEXT: 'Tx',
+        fitz.PDF_WIDGET_TYPE_CHECKBOX: 'Btn',
+        fitz.PDF_WIDGET_TYPE_RADIOBUTTON: 'Btn',
+        fitz.PDF_WIDGET_TYPE_BUTTON: 'Btn',
+        fitz.PDF_WIDGET_TYPE_COMBOBOX: 'Ch',
+        fitz.PDF_WIDGET_TYPE_LISTBOX: 'Ch',
+        fitz.PDF_WIDGET_TYPE_SIGNATURE: 'Sig',
+    }
 except ImportError:
     PYMUPDF_AVAILABLE = False
+    PYMUPDF_FIELD_TYPES = {}
     print("Warning: PyMuPDF not available. PDF pre-filling will be limited.")
 
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def dumps_json(value):
+    """Serialize a value for a JSON/JSONB column, using orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(value)
+
+
 try:
     import psycopg2
-    from psycopg2.extras import RealDictCursor, Json
+    from psycopg2.extras import RealDictCursor, Json, execute_values
+    from psycopg2.pool import ThreadedConnectionPool
     PSYCOPG2_AVAILABLE = True
     print("✅ psycopg2 available for database operations")
 except ImportError:
@@ -495,12 +576,18 @@ except ImportError:
 
 # Tracks whether the master_templates table includes the pdf_blob column.
 PDF_BLOB_COLUMN_AVAILABLE = None
+# Tracks whether master_templates.pdf_sha256 has been ensured for change detection.
+PDF_SHA256_COLUMN_AVAILABLE = None
 
 app = Flask(__name__, static_folder='frontend/build', static_url_path='')
 CORS(app)
 
 # Initialize Supabase (for storage only) - with better error handling
 supabase = None
+supabase_storage = None
+# Buckets tried, in order, for master template uploads; the last bucket that accepted one goes first.
+SUPABASE_TEMPLATE_BUCKETS = ('certificates', 'files', 'templates', 'default')
+supabase_template_bucket = None
 if SUPABASE_AVAILABLE:
     try:
         supabase_url = os.environ.get('SUPABASE_URL')
@@ -546,6 +633,62 @@ def get_db():
     )
 
 
+# Connection pool for paths that borrow connections repeatedly (template refreshes).
+# Created lazily so each gunicorn worker builds its own pool after forking.
+DB_POOL_MAX_CONNECTIONS = 4
+db_pool = None
+db_pool_lock = threading.Lock()
+
+
+def get_pooled_db():
+    """
+    Borrow a connection from the shared pool; hand it back with release_pooled_db().
+    Idle pooled connections can be dropped by the server, so each checkout is pinged
+    and dead connections are discarded instead of being handed to the caller.
+    """
+    global db_pool
+    if not PSYCOPG2_AVAILABLE:
+        raise Exception("psycopg2 not available. Database functionality disabled.")
+
+    if db_pool is None:
+        with db_pool_lock:
+            if db_pool is None:
+                database_url = os.environ.get('DATABASE_URL')
+                if not database_url:
+                    raise Exception("DATABASE_URL environment variable not set")
+                db_pool = ThreadedConnectionPool(
+                    1,
+                    DB_POOL_MAX_CONNECTIONS,
+                    database_url,
+                    cursor_factory=RealDictCursor,
+                    sslmode='require'
+                )
+
+    last_error = None
+    for _ in range(DB_POOL_MAX_CONNECTIONS + 1):
+        conn = db_pool.getconn()
+        if conn.closed:
+            db_pool.putconn(conn, close=True)
+            continue
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return conn
+        except psycopg2.Error as ping_error:
+            last_error = ping_error
+            db_pool.putconn(conn, close=True)
+
+    raise last_error or Exception("No usable database connection in pool")
+
+
+def release_pooled_db(conn):
+    """Return a borrowed connection; the pool rolls back any open transaction and broken ones are closed."""
+    if conn is None or db_pool is None:
+        return
+    db_pool.putconn(conn, close=bool(conn.closed))
+
+
 def ensure_pdf_blob_column(cur=None):
     """
     Detect whether the master_templates table has a pdf_blob column.
@@ -581,7 +724,7 @@ def ensure_pdf_blob_column(cur=None):
         if not PDF_BLOB_COLUMN_AVAILABLE:
             print("master_templates.pdf_blob column missing; operating without DB-stored PDFs.")
     except Exception as detection_error:
-        if cursor and cursor.connection:
+        if cursor and not cursor.connection.closed:
             cursor.connection.rollback()
         print(f"Warning: Unable to determine master_templates.pdf_blob availability: {detection_error}")
         PDF_BLOB_COLUMN_AVAILABLE = False
@@ -593,6 +736,59 @@ def ensure_pdf_blob_column(cur=None):
 
     return PDF_BLOB_COLUMN_AVAILABLE
 
+def ensure_pdf_sha256_column(cur=None):
+    """
+    Detect whether master_templates has the pdf_sha256 column used to detect unchanged PDFs.
+    Read-only: the column itself is added by create_database_schema. A successful detection is
+    cached globally; a failed lookup is not, so a transient error does not disable SHA checks.
+    """
+    global PDF_SHA256_COLUMN_AVAILABLE
+    if PDF_SHA256_COLUMN_AVAILABLE is not None:
+        return PDF_SHA256_COLUMN_AVAILABLE
+
+    if not PSYCOPG2_AVAILABLE:
+        return False
+
+    close_conn = False
+    conn = None
+    cursor = cur
+    try:
+        if cursor is None:
+            conn = get_db()
+            cursor = conn.cursor()
+            close_conn = True
+
+        cursor.execute(
+            '''
+            SELECT 1
+            FROM information_schema.columns
+            WHERE LOWER(table_name) = 'master_templates'
+              AND column_name = 'pdf_sha256'
+            LIMIT 1
+            '''
+        )
+        PDF_SHA256_COLUMN_AVAILABLE = cursor.fetchone() is not None
+        if not PDF_SHA256_COLUMN_AVAILABLE:
+            print("master_templates.pdf_sha256 column missing; run /api/setup to enable SHA-256 change detection.")
+        return PDF_SHA256_COLUMN_AVAILABLE
+    except Exception as detection_error:
+        if cursor and not cursor.connection.closed:
+            cursor.connection.rollback()
+        print(f"Warning: Unable to determine master_templates.pdf_sha256 availability: {detection_error}")
+        return False
+    finally:
+        if close_conn and cursor:
+            cursor.close()
+        if close_conn and conn:
+            conn.close()
+
+def get_supabase_storage():
+    """Return a shared Supabase storage client so uploads reuse one HTTP connection pool."""
+    global supabase_storage
+    if supabase_storage is None and supabase:
+        supabase_storage = supabase.storage
+    return supabase_storage
+
 def setup_supabase_storage():
     """Setup Supabase storage using default bucket"""
     try:
@@ -601,7 +797,7 @@ def setup_supabase_storage():
         
         # Try to list existing buckets to verify connection
         try:
-            buckets = supabase.storage.list_buckets()
+            buckets = get_supabase_storage().list_buckets()
             print(f"✅ Connected to Supabase storage. Available buckets: {[b.name for b in buckets]}")
             
             # Use the first available bucket or default to 'files'
@@ -622,151 +818,229 @@ def setup_supabase_storage():
         print(f"❌ Supabase storage setup error: {e}")
         return False
 
+# Tables created by create_database_schema and the columns its migrations add to them.
+DATABASE_SCHEMA_REQUIRED_COLUMNS = {
+    'master_templates': {'pdf_blob', 'pdf_sha256', 'form_fields'},
+    'template_data': {'field_values'},
+    'field_mappings': {'fields'},
+    'generated_certificates': {'template_id', 'certificate_holder_id', 'filename', 'pdf_blob'},
+    'certificate_holders': {
+        'master_remarks', 'address_line1', 'address_line2', 'city', 'state',
+        'postal_code', 'phone', 'updated_at', 'email', 'address',
+    },
+    'agency_settings': {'signature_image'},
+}
+
+# Indexes created by the schema statements; a new index must be listed here or existing deployments skip it.
+DATABASE_SCHEMA_REQUIRED_INDEXES = {
+    'idx_agency_settings_account',
+    'idx_template_data_account',
+    'idx_template_data_template',
+    'idx_master_templates_type',
+    'idx_master_templates_pdf_sha256',
+    'idx_master_templates_form_fields_gin',
+    'idx_generated_certificates_account',
+    'idx_generated_certificates_holder',
+    'idx_certificate_holders_account',
+}
+
+
+def database_schema_is_current(cur):
+    """Return True when every table, migrated column and index from create_database_schema already exists."""
+    cur.execute(
+        '''
+        SELECT table_name, column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = ANY(%s)
+        ''',
+        (list(DATABASE_SCHEMA_REQUIRED_COLUMNS.keys()),)
+    )
+    present_columns = {}
+    for row in cur.fetchall():
+        present_columns.setdefault(row['table_name'], set()).add(row['column_name'])
+
+    columns_current = all(
+        table in present_columns and required <= present_columns[table]
+        for table, required in DATABASE_SCHEMA_REQUIRED_COLUMNS.items()
+    )
+    if not columns_current:
+        return False
+
+    cur.execute(
+        '''
+        SELECT indexname
+        FROM pg_indexes
+        WHERE schemaname = current_schema()
+          AND indexname = ANY(%s)
+        ''',
+        (list(DATABASE_SCHEMA_REQUIRED_INDEXES),)
+    )
+    present_indexes = {row['indexname'] for row in cur.fetchall()}
+    return DATABASE_SCHEMA_REQUIRED_INDEXES <= present_indexes
+
+
+# DDL applied by create_database_schema, sent to Postgres as a single batch.
+DATABASE_SCHEMA_STATEMENTS = [
+    # Enable UUID extension
+    'CREATE EXTENSION IF NOT EXISTS "uuid-ossp";',
+
+    # Master Templates Table
+    '''
+        CREATE TABLE IF NOT EXISTS master_templates (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            template_name VARCHAR(100) NOT NULL UNIQUE,
+            template_type VARCHAR(50) NOT NULL,
+            storage_path VARCHAR(500),
+            file_size INTEGER,
+            pdf_blob BYTEA,
+            pdf_sha256 CHAR(64),
+            form_fields JSONB,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        );
+    ''',
+    'ALTER TABLE master_templates ADD COLUMN IF NOT EXISTS pdf_blob BYTEA;',
+    'ALTER TABLE master_templates ADD COLUMN IF NOT EXISTS pdf_sha256 CHAR(64);',
+    'ALTER TABLE master_templates ALTER COLUMN storage_path DROP NOT NULL;',
+
+    # Template Data by Account
+    '''
+        CREATE TABLE IF NOT EXISTS template_data (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            account_id VARCHAR(18) NOT NULL,
+            template_id UUID REFERENCES master_templates(id),
+            field_values JSONB NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW(),
+            version INTEGER DEFAULT 1,
+            UNIQUE(account_id, template_id)
+        );
+    ''',
+
+    # Field mappings editable via admin UI
+    '''
+        CREATE TABLE IF NOT EXISTS field_mappings (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            template_key VARCHAR(100) NOT NULL,
+            mapping_scope VARCHAR(50) NOT NULL,
+            fields JSONB NOT NULL DEFAULT '{}'::JSONB,
+            updated_by VARCHAR(100),
+            updated_at TIMESTAMP DEFAULT NOW(),
+            UNIQUE(template_key, mapping_scope)
+        );
+    ''',
+
+    # Generated Certificates
+    '''
+        CREATE TABLE IF NOT EXISTS generated_certificates (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            account_id VARCHAR(18) NOT NULL,
+            template_id UUID REFERENCES master_templates(id),
+            certificate_name VARCHAR(255),
+            storage_path VARCHAR(500),
+            status VARCHAR(50) DEFAULT 'draft',
+            generated_at TIMESTAMP DEFAULT NOW()
+        );
+    ''',
+
+    # Certificate Holders
+    '''
+        CREATE TABLE IF NOT EXISTS certificate_holders (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            account_id VARCHAR(18) NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            master_remarks TEXT,
+            address_line1 VARCHAR(255),
+            address_line2 VARCHAR(255),
+            city VARCHAR(120),
+            state VARCHAR(2),
+            postal_code VARCHAR(20),
+            email VARCHAR(255),
+            phone VARCHAR(50),
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW(),
+            address TEXT
+        );
+    ''',
+    'ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS master_remarks TEXT;',
+    'ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS address_line1 VARCHAR(255);',
+    'ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS address_line2 VARCHAR(255);',
+    'ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS city VARCHAR(120);',
+    'ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS state VARCHAR(2);',
+    'ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS postal_code VARCHAR(20);',
+    'ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS phone VARCHAR(50);',
+    'ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;',
+    'ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS email VARCHAR(255);',
+    'ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS address TEXT;',
+    'ALTER TABLE certificate_holders ALTER COLUMN name SET NOT NULL;',
+    "UPDATE certificate_holders SET address_line1 = COALESCE(address_line1, address) WHERE address IS NOT NULL AND (address_line1 IS NULL OR address_line1 = '');",
+    'UPDATE certificate_holders SET updated_at = COALESCE(updated_at, created_at, NOW());',
+    'ALTER TABLE certificate_holders ALTER COLUMN updated_at SET DEFAULT NOW();',
+
+    # Agency Settings - for storing agency/producer data per account
+    '''
+        CREATE TABLE IF NOT EXISTS agency_settings (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            account_id VARCHAR(18) NOT NULL,
+            name VARCHAR(255),
+            street VARCHAR(255),
+            suite VARCHAR(100),
+            city VARCHAR(120),
+            state VARCHAR(2),
+            zip VARCHAR(20),
+            phone VARCHAR(50),
+            fax VARCHAR(50),
+            email VARCHAR(255),
+            producer_name VARCHAR(255),
+            producer_phone VARCHAR(50),
+            producer_email VARCHAR(255),
+            signature_image TEXT,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW(),
+            UNIQUE(account_id)
+        );
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_agency_settings_account ON agency_settings(account_id);',
+
+    # Create indexes
+    'CREATE INDEX IF NOT EXISTS idx_template_data_account ON template_data(account_id);',
+    'CREATE INDEX IF NOT EXISTS idx_template_data_template ON template_data(template_id);',
+    'CREATE INDEX IF NOT EXISTS idx_master_templates_type ON master_templates(template_type);',
+    'CREATE INDEX IF NOT EXISTS idx_master_templates_pdf_sha256 ON master_templates(pdf_sha256);',
+    'CREATE INDEX IF NOT EXISTS idx_master_templates_form_fields_gin ON master_templates USING GIN (form_fields jsonb_path_ops);',
+    'CREATE INDEX IF NOT EXISTS idx_generated_certificates_account ON generated_certificates(account_id);',
+    'CREATE INDEX IF NOT EXISTS idx_certificate_holders_account ON certificate_holders(account_id);',
+]
+
+
 def create_database_schema():
     """Create the complete database schema"""
+    global PDF_BLOB_COLUMN_AVAILABLE, PDF_SHA256_COLUMN_AVAILABLE, GENERATED_CERTIFICATES_TABLE_READY
     try:
         conn = get_db()
         cur = conn.cursor()
-        pdf_blob_supported = ensure_pdf_blob_column(cur)
-        
-        # Enable UUID extension
-        cur.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp";')
-        
-        # Master Templates Table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS master_templates (
-                id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-                template_name VARCHAR(100) NOT NULL UNIQUE,
-                template_type VARCHAR(50) NOT NULL,
-                storage_path VARCHAR(500),
-                file_size INTEGER,
-                pdf_blob BYTEA,
-                form_fields JSONB,
-                created_at TIMESTAMP DEFAULT NOW(),
-                updated_at TIMESTAMP DEFAULT NOW()
-            );
-        ''')
-        cur.execute('ALTER TABLE master_templates ADD COLUMN IF NOT EXISTS pdf_blob BYTEA;')
-        
-        # Ensure pdf_blob column exists (migration for existing databases)
-        try:
-            cur.execute('SELECT pdf_blob FROM master_templates LIMIT 1;')
-        except psycopg2.errors.UndefinedColumn:
-            print("Adding missing pdf_blob column to master_templates...")
-            cur.execute('ALTER TABLE master_templates ADD COLUMN pdf_blob BYTEA;')
-            conn.commit()
-            print("Successfully added pdf_blob column")
-        cur.execute('ALTER TABLE master_templates ALTER COLUMN storage_path DROP NOT NULL;')
-        
-        # Template Data by Account
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS template_data (
-                id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-                account_id VARCHAR(18) NOT NULL,
-                template_id UUID REFERENCES master_templates(id),
-                field_values JSONB NOT NULL,
-                created_at TIMESTAMP DEFAULT NOW(),
-                updated_at TIMESTAMP DEFAULT NOW(),
-                version INTEGER DEFAULT 1,
-                UNIQUE(account_id, template_id)
-            );
-        ''')
 
-        # Field mappings editable via admin UI
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS field_mappings (
-                id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-                template_key VARCHAR(100) NOT NULL,
-                mapping_scope VARCHAR(50) NOT NULL,
-                fields JSONB NOT NULL DEFAULT '{}'::JSONB,
-                updated_by VARCHAR(100),
-                updated_at TIMESTAMP DEFAULT NOW(),
-                UNIQUE(template_key, mapping_scope)
-            );
-        ''')
-        
-        # Generated Certificates
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS generated_certificates (
-                id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-                account_id VARCHAR(18) NOT NULL,
-                template_id UUID REFERENCES master_templates(id),
-                certificate_name VARCHAR(255),
-                storage_path VARCHAR(500),
-                status VARCHAR(50) DEFAULT 'draft',
-                generated_at TIMESTAMP DEFAULT NOW()
-            );
-        ''')
-        
-        # Certificate Holders
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS certificate_holders (
-                id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-                account_id VARCHAR(18) NOT NULL,
-                name VARCHAR(255) NOT NULL,
-                master_remarks TEXT,
-                address_line1 VARCHAR(255),
-                address_line2 VARCHAR(255),
-                city VARCHAR(120),
-                state VARCHAR(2),
-                postal_code VARCHAR(20),
-                email VARCHAR(255),
-                phone VARCHAR(50),
-                created_at TIMESTAMP DEFAULT NOW(),
-                updated_at TIMESTAMP DEFAULT NOW(),
-                address TEXT
-            );
-        ''')
-        cur.execute('ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS master_remarks TEXT;')
-        cur.execute('ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS address_line1 VARCHAR(255);')
-        cur.execute('ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS address_line2 VARCHAR(255);')
-        cur.execute('ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS city VARCHAR(120);')
-        cur.execute('ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS state VARCHAR(2);')
-        cur.execute('ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS postal_code VARCHAR(20);')
-        cur.execute('ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS phone VARCHAR(50);')
-        cur.execute('ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;')
-        cur.execute('ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS email VARCHAR(255);')
-        cur.execute('ALTER TABLE certificate_holders ADD COLUMN IF NOT EXISTS address TEXT;')
-        cur.execute('ALTER TABLE certificate_holders ALTER COLUMN name SET NOT NULL;')
-        cur.execute('UPDATE certificate_holders SET address_line1 = COALESCE(address_line1, address) WHERE address IS NOT NULL AND (address_line1 IS NULL OR address_line1 = \'\');')
-        cur.execute('UPDATE certificate_holders SET updated_at = COALESCE(updated_at, created_at, NOW());')
-        cur.execute('ALTER TABLE certificate_holders ALTER COLUMN updated_at SET DEFAULT NOW();')
-
-        # Agency Settings - for storing agency/producer data per account
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS agency_settings (
-                id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-                account_id VARCHAR(18) NOT NULL,
-                name VARCHAR(255),
-                street VARCHAR(255),
-                suite VARCHAR(100),
-                city VARCHAR(120),
-                state VARCHAR(2),
-                zip VARCHAR(20),
-                phone VARCHAR(50),
-                fax VARCHAR(50),
-                email VARCHAR(255),
-                producer_name VARCHAR(255),
-                producer_phone VARCHAR(50),
-                producer_email VARCHAR(255),
-                signature_image TEXT,
-                created_at TIMESTAMP DEFAULT NOW(),
-                updated_at TIMESTAMP DEFAULT NOW(),
-                UNIQUE(account_id)
-            );
-        ''')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_agency_settings_account ON agency_settings(account_id);')
-
-        # Create indexes
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_template_data_account ON template_data(account_id);')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_template_data_template ON template_data(template_id);')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_master_templates_type ON master_templates(template_type);')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_generated_certificates_account ON generated_certificates(account_id);')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_certificate_holders_account ON certificate_holders(account_id);')
-        
+        # Re-runs are the common case; one catalog query avoids re-issuing every DDL statement.
+        if database_schema_is_current(cur):
+            cur.close()
+            conn.close()
+            PDF_BLOB_COLUMN_AVAILABLE = True
+            PDF_SHA256_COLUMN_AVAILABLE = True
+            GENERATED_CERTIFICATES_TABLE_READY = True
+            print("Database schema already up to date")
+            return True
+
+        # One round trip and one commit for the whole schema, generated_certificates migration included.
+        cur.execute('\n'.join(DATABASE_SCHEMA_STATEMENTS + GENERATED_CERTIFICATES_STATEMENTS))
+
         conn.commit()
         cur.close()
         conn.close()
+        # The schema adds these columns, so later checks can skip introspection and migration.
+        PDF_BLOB_COLUMN_AVAILABLE = True
+        PDF_SHA256_COLUMN_AVAILABLE = True
+        GENERATED_CERTIFICATES_TABLE_READY = True
         print("âœ… Database schema created successfully")
         return True
         
@@ -867,9 +1141,33 @@ def ensure_certificate_holder_extended_columns():
             conn.close()
 
 
+# generated_certificates table and the columns/indexes added after it first shipped.
+GENERATED_CERTIFICATES_STATEMENTS = [
+    '''
+        CREATE TABLE IF NOT EXISTS generated_certificates (
+            id UUID PRIMARY KEY,
+            account_id VARCHAR(18) NOT NULL,
+            template_id UUID,
+            certificate_holder_id UUID,
+            filename TEXT,
+            storage_path TEXT,
+            pdf_blob BYTEA,
+            generated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
+        );
+    ''',
+    'ALTER TABLE generated_certificates ADD COLUMN IF NOT EXISTS certificate_holder_id UUID;',
+    'ALTER TABLE generated_certificates ADD COLUMN IF NOT EXISTS filename TEXT;',
+    'ALTER TABLE generated_certificates ADD COLUMN IF NOT EXISTS pdf_blob BYTEA;',
+    'CREATE INDEX IF NOT EXISTS idx_generated_certificates_account ON generated_certificates(account_id);',
+    'CREATE INDEX IF NOT EXISTS idx_generated_certificates_holder ON generated_certificates(certificate_holder_id);',
+]
+GENERATED_CERTIFICATES_TABLE_READY = False
+
+
 def ensure_generated_certificates_table():
-    """Ensure the generated_certificates table exists with required columns."""
-    if not PSYCOPG2_AVAILABLE:
+    """Ensure the generated_certificates table exists with required columns (once per process)."""
+    global GENERATED_CERTIFICATES_TABLE_READY
+    if not PSYCOPG2_AVAILABLE or GENERATED_CERTIFICATES_TABLE_READY:
         return
 
     conn = None
@@ -877,41 +1175,10 @@ def ensure_generated_certificates_table():
     try:
         conn = get_db()
         cur = conn.cursor()
-
-        # Create table if not exists
-        cur.execute(
-            '''
-            CREATE TABLE IF NOT EXISTS generated_certificates (
-                id UUID PRIMARY KEY,
-                account_id VARCHAR(18) NOT NULL,
-                template_id UUID,
-                certificate_holder_id UUID,
-                filename TEXT,
-                storage_path TEXT,
-                pdf_blob BYTEA,
-                generated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
-            )
-            '''
-        )
-
-        # Add missing columns to existing table (migration)
-        cur.execute('ALTER TABLE generated_certificates ADD COLUMN IF NOT EXISTS certificate_holder_id UUID;')
-        cur.execute('ALTER TABLE generated_certificates ADD COLUMN IF NOT EXISTS filename TEXT;')
-        cur.execute('ALTER TABLE generated_certificates ADD COLUMN IF NOT EXISTS pdf_blob BYTEA;')
-
-        cur.execute(
-            '''
-            CREATE INDEX IF NOT EXISTS idx_generated_certificates_account
-            ON generated_certificates(account_id)
-            '''
-        )
-        cur.execute(
-            '''
-            CREATE INDEX IF NOT EXISTS idx_generated_certificates_holder
-            ON generated_certificates(certificate_holder_id)
-            '''
-        )
+        # Table, migrations and indexes in one round trip and one transaction
+        cur.execute('\n'.join(GENERATED_CERTIFICATES_STATEMENTS))
         conn.commit()
+        GENERATED_CERTIFICATES_TABLE_READY = True
         print("[ensure_generated_certificates_table] Table and columns ensured successfully")
     except Exception as error:
         if conn:
@@ -1128,11 +1395,37 @@ def load_master_template_pdf(template_type="acord25"):
             conn.close()
 
 
-def refresh_master_template_from_local(template_type, template_name=None, force=False):
-    """Replace stored master template PDF with the local copy."""
-    if not PSYCOPG2_AVAILABLE:
-        raise RuntimeError("psycopg2 not available; cannot refresh master templates.")
+def scan_local_template_dir():
+    """Return {lowercase filename: path} for the PDFs in the local template directory in one pass."""
+    try:
+        with os.scandir(LOCAL_TEMPLATE_DIR) as entries:
+            return {
+                entry.name.lower(): Path(entry.path)
+                for entry in entries
+                if entry.name.lower().endswith('.pdf') and entry.is_file()
+            }
+    except FileNotFoundError:
+        return {}
+
 
+def get_local_template_dir_index():
+    """Return scan_local_template_dir() results, re-scanning only after the directory changes."""
+    try:
+        mtime_ns = LOCAL_TEMPLATE_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    if LOCAL_TEMPLATE_DIR_INDEX['mtime_ns'] != mtime_ns:
+        LOCAL_TEMPLATE_DIR_INDEX['files'] = scan_local_template_dir()
+        LOCAL_TEMPLATE_DIR_INDEX['mtime_ns'] = mtime_ns
+    return LOCAL_TEMPLATE_DIR_INDEX['files']
+
+
+def load_local_master_template(template_type, template_name=None, local_files=None):
+    """
+    Read a bundled master template PDF and describe how it should be stored.
+    When local_files (from scan_local_template_dir) is given, it replaces the per-file existence check.
+    """
     if not template_type:
         raise ValueError("template_type is required")
 
@@ -1142,181 +1435,257 @@ def refresh_master_template_from_local(template_type, template_name=None, force=
     if not local_filename:
         raise ValueError(f"No local template mapping found for '{template_type}'")
 
-    local_path = LOCAL_TEMPLATE_DIR / local_filename
-    if not local_path.exists():
-        raise FileNotFoundError(f"Local template file not found: {local_path}")
+    if local_files is not None:
+        local_path = local_files.get(local_filename.lower())
+        if local_path is None:
+            raise FileNotFoundError(f"Local template file not found: {LOCAL_TEMPLATE_DIR / local_filename}")
+    else:
+        local_path = LOCAL_TEMPLATE_DIR / local_filename
+        if not local_path.exists():
+            raise FileNotFoundError(f"Local template file not found: {local_path}")
+
+    stat_result = local_path.stat()
+    if stat_result.st_size == 0:
+        raise ValueError(f"Local template file is empty: {local_path}")
+
+    cache_key = str(local_path)
+    cached = LOCAL_TEMPLATE_DIGEST_CACHE.get(cache_key)
+    if cached and cached[:2] == (stat_result.st_mtime_ns, stat_result.st_size):
+        file_size, pdf_sha256 = stat_result.st_size, cached[2]
+    else:
+        # Hash straight from the page cache; the bytes are only read if the row must be rewritten.
+        with open(local_path, 'rb') as pdf_file:
+            with mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as pdf_map:
+                file_size = len(pdf_map)
+                pdf_sha256 = hashlib.sha256(pdf_map).hexdigest()
+        LOCAL_TEMPLATE_DIGEST_CACHE[cache_key] = (stat_result.st_mtime_ns, file_size, pdf_sha256)
 
-    pdf_bytes = local_path.read_bytes()
-    file_size = len(pdf_bytes)
-    storage_path = f"local://{local_path.name}"
     default_template_name = template_config.get('display_name')
-    target_template_name = template_name or default_template_name or template_type_key.upper()
-    extracted_fields = extract_form_fields_from_pdf_bytes(pdf_bytes)
-    form_fields_payload = enrich_form_fields_payload(
-        {'fields': extracted_fields or []},
-        method='local_template_refresh'
-    )
+    return {
+        'template_type': template_type_key,
+        'template_name': template_name or default_template_name or template_type_key.upper(),
+        'storage_path': f"local://{local_path.name}",
+        'local_path': local_path,
+        'pdf_bytes': None,
+        'file_size': file_size,
+        'pdf_sha256': pdf_sha256,
+    }
 
-    conn = None
-    cur = None
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-        pdf_blob_supported = ensure_pdf_blob_column(cur)
-        select_columns = (
-            'id, template_name, template_type, storage_path, file_size, pdf_blob'
-            if pdf_blob_supported
-            else 'id, template_name, template_type, storage_path, file_size, NULL::BYTEA AS pdf_blob'
-        )
 
-        base_select_sql = f''' 
-            SELECT {select_columns}
+def read_local_master_template_bytes(template):
+    """Return the PDF bytes for a template from load_local_master_template, reading them on first use."""
+    if template.get('pdf_bytes') is None:
+        template['pdf_bytes'] = template['local_path'].read_bytes()
+    return template['pdf_bytes']
+
+
+def fetch_existing_master_templates(cur, templates, select_columns):
+    """
+    Return the current master_templates row for each loaded template, keyed by template type.
+    Matches on template_type first and falls back to template_name, one query per pass.
+    """
+    existing = {}
+    type_keys = [template['template_type'] for template in templates]
+    cur.execute(
+        f'''
+        SELECT DISTINCT ON (LOWER(template_type)) {select_columns}, LOWER(template_type) AS lookup_key
+        FROM master_templates
+        WHERE LOWER(template_type) = ANY(%s)
+        ORDER BY LOWER(template_type), updated_at DESC NULLS LAST, created_at DESC
+        ''',
+        (type_keys,)
+    )
+    for row in cur.fetchall():
+        row = dict(row) if not isinstance(row, dict) else row
+        existing[row['lookup_key']] = row
+
+    missing_by_name = {
+        template['template_name'].lower(): template['template_type']
+        for template in templates
+        if template['template_type'] not in existing and template['template_name']
+    }
+    if missing_by_name:
+        cur.execute(
+            f'''
+            SELECT DISTINCT ON (LOWER(template_name)) {select_columns}, LOWER(template_name) AS lookup_key
             FROM master_templates
-            WHERE LOWER(template_type) = %s
-            ORDER BY updated_at DESC NULLS LAST, created_at DESC
-            LIMIT 1
-        '''
+            WHERE LOWER(template_name) = ANY(%s)
+            ORDER BY LOWER(template_name), updated_at DESC NULLS LAST, created_at DESC
+            ''',
+            (list(missing_by_name.keys()),)
+        )
+        for row in cur.fetchall():
+            row = dict(row) if not isinstance(row, dict) else row
+            existing[missing_by_name[row['lookup_key']]] = row
 
-        cur.execute(base_select_sql, (template_type_key,))
-        existing = cur.fetchone()
+    return existing
 
-        if not existing and target_template_name:
-            select_by_name = f'''
-                SELECT {select_columns}
-                FROM master_templates
-                WHERE LOWER(template_name) = %s
-                ORDER BY updated_at DESC NULLS LAST, created_at DESC
-                LIMIT 1
-            '''
-            cur.execute(select_by_name, (target_template_name.lower(),))
-            existing = cur.fetchone()
 
-        target_id = None
-        operation = 'inserted'
-        if existing:
-            existing_dict = dict(existing) if not isinstance(existing, dict) else existing
-            target_id = existing_dict.get('id')
-            existing_name = existing_dict.get('template_name')
-            existing_size = existing_dict.get('file_size')
-            existing_blob = existing_dict.get('pdf_blob') if pdf_blob_supported else None
-            existing_bytes = None
-            if pdf_blob_supported and existing_blob is not None:
-                try:
-                    existing_bytes = bytes(existing_blob)
-                except (TypeError, ValueError):
-                    existing_bytes = existing_blob
+def store_local_master_templates(cur, templates, force=False):
+    """
+    Write loaded local templates into master_templates using the caller's cursor.
+    Unchanged templates are skipped; inserts and updates are each sent as one batch.
+    All queries, including the column checks, run on cur; the caller is responsible for committing.
+    """
+    sha256_supported = ensure_pdf_sha256_column(cur)
+    pdf_blob_supported = ensure_pdf_blob_column(cur)
+    if sha256_supported:
+        # The stored digest is enough to detect an unchanged PDF; skip fetching the blob.
+        select_columns = 'id, template_name, template_type, storage_path, file_size, pdf_sha256, NULL::BYTEA AS pdf_blob'
+    elif pdf_blob_supported:
+        select_columns = 'id, template_name, template_type, storage_path, file_size, pdf_blob'
+    else:
+        select_columns = 'id, template_name, template_type, storage_path, file_size, NULL::BYTEA AS pdf_blob'
 
-            same_pdf_bytes = pdf_blob_supported and existing_bytes == pdf_bytes
+    existing_rows = fetch_existing_master_templates(cur, templates, select_columns)
 
-            if not force and same_pdf_bytes and existing_name == target_template_name and existing_size == file_size:
-                return {
+    columns = ['template_name', 'template_type', 'storage_path', 'file_size']
+    if pdf_blob_supported:
+        columns.append('pdf_blob')
+    if sha256_supported:
+        columns.append('pdf_sha256')
+    columns.append('form_fields')
+    placeholders = ', '.join('%s::jsonb' if column == 'form_fields' else '%s' for column in columns)
+
+    results = {}
+    changed_templates = []
+    for template in templates:
+        template_type_key = template['template_type']
+        existing = existing_rows.get(template_type_key)
+        if existing:
+            if sha256_supported:
+                same_pdf_bytes = existing.get('pdf_sha256') == template['pdf_sha256']
+            else:
+                existing_blob = existing.get('pdf_blob') if pdf_blob_supported else None
+                # psycopg2 returns BYTEA as a memoryview, which compares against bytes without a copy.
+                same_pdf_bytes = pdf_blob_supported and existing_blob is not None and existing_blob == read_local_master_template_bytes(template)
+
+            if (
+                not force
+                and same_pdf_bytes
+                and existing.get('template_name') == template['template_name']
+                and existing.get('file_size') == template['file_size']
+            ):
+                results[template_type_key] = {
                     'updated_rows': 0,
                     'skipped': True,
-                    'template_id': target_id,
+                    'template_id': existing.get('id'),
                     'template_type': template_type_key,
-                    'template_name': target_template_name,
-                    'file_size': file_size,
-                    'storage_path': storage_path
+                    'template_name': template['template_name'],
+                    'file_size': template['file_size'],
+                    'storage_path': template['storage_path']
                 }
+                continue
 
-            if pdf_blob_supported:
-                update_sql = '''
-                    UPDATE master_templates
-                    SET template_name = %s,
-                        template_type = %s,
-                        storage_path = %s,
-                        file_size = %s,
-                        pdf_blob = %s,
-                        form_fields = %s,
-                        updated_at = NOW()
-                    WHERE id = %s
-                '''
-                update_params = (
-                    target_template_name,
-                    template_type_key,
-                    storage_path,
-                    file_size,
-                    psycopg2.Binary(pdf_bytes),
-                    Json(form_fields_payload),
-                    target_id,
-                )
-            else:
-                update_sql = '''
-                    UPDATE master_templates
-                    SET template_name = %s,
-                        template_type = %s,
-                        storage_path = %s,
-                        file_size = %s,
-                        form_fields = %s,
-                        updated_at = NOW()
-                    WHERE id = %s
-                '''
-                update_params = (
-                    target_template_name,
-                    template_type_key,
-                    storage_path,
-                    file_size,
-                    Json(form_fields_payload),
-                    target_id,
-                )
+        changed_templates.append((template, existing))
+
+    # Only parse the PDFs whose stored rows have to be rewritten.
+    fields_by_type = extract_master_template_fields_batch([template for template, _ in changed_templates])
 
-            cur.execute(update_sql, update_params)
-            updated = cur.rowcount
+    insert_rows = []
+    update_rows = []
+    for template, existing in changed_templates:
+        template_type_key = template['template_type']
+        pdf_bytes = read_local_master_template_bytes(template)
+        form_fields_payload = enrich_form_fields_payload(
+            {'fields': fields_by_type.get(template_type_key) or []},
+            method='local_template_refresh'
+        )
+
+        values = [template['template_name'], template_type_key, template['storage_path'], template['file_size']]
+        if pdf_blob_supported:
+            values.append(psycopg2.Binary(pdf_bytes))
+        if sha256_supported:
+            values.append(template['pdf_sha256'])
+        # Serialize once up front and bind the text as ::jsonb in the batch below;
+        # templates without fields store NULL rather than an empty payload.
+        values.append(dumps_json(form_fields_payload) if form_fields_payload['fields'] else None)
+
+        if existing:
+            target_id = existing.get('id')
+            update_rows.append([target_id] + values)
             operation = 'updated'
         else:
             target_id = str(uuid.uuid4())
-            if pdf_blob_supported:
-                insert_sql = '''
-                    INSERT INTO master_templates (id, template_name, template_type, storage_path, file_size, pdf_blob, form_fields)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                '''
-                insert_params = (
-                    target_id,
-                    target_template_name,
-                    template_type_key,
-                    storage_path,
-                    file_size,
-                    psycopg2.Binary(pdf_bytes),
-                    Json(form_fields_payload),
-                )
-            else:
-                insert_sql = '''
-                    INSERT INTO master_templates (id, template_name, template_type, storage_path, file_size, form_fields)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                '''
-                insert_params = (
-                    target_id,
-                    target_template_name,
-                    template_type_key,
-                    storage_path,
-                    file_size,
-                    Json(form_fields_payload),
-                )
-
-            cur.execute(insert_sql, insert_params)
-            updated = cur.rowcount
+            insert_rows.append([target_id] + values)
             operation = 'inserted'
 
-        conn.commit()
-        return {
-            'updated_rows': updated,
+        results[template_type_key] = {
+            'updated_rows': 1,
             'skipped': False,
             'operation': operation,
             'template_id': target_id,
             'template_type': template_type_key,
-            'template_name': target_template_name,
-            'file_size': file_size,
-            'storage_path': storage_path
+            'template_name': template['template_name'],
+            'file_size': template['file_size'],
+            'storage_path': template['storage_path']
         }
+
+    if insert_rows:
+        execute_values(
+            cur,
+            f"INSERT INTO master_templates (id, {', '.join(columns)}) VALUES %s",
+            insert_rows,
+            template=f'(%s, {placeholders})',
+            page_size=len(insert_rows)
+        )
+
+    if update_rows:
+        assignments = ', '.join(f'{column} = v.{column}' for column in columns)
+        execute_values(
+            cur,
+            f'''
+            UPDATE master_templates AS mt
+            SET {assignments}, updated_at = NOW()
+            FROM (VALUES %s) AS v(id, {', '.join(columns)})
+            WHERE mt.id = v.id
+            ''',
+            update_rows,
+            template=f'(%s::uuid, {placeholders})',
+            page_size=len(update_rows)
+        )
+
+    return results
+
+
+def refresh_master_template_from_local(template_type, template_name=None, force=False, cur=None):
+    """
+    Replace stored master template PDF with the local copy.
+
+    Pass the caller's cursor to store and commit on its connection instead of borrowing one from the pool;
+    every query in that path (column detection included) then runs on that one connection.
+    """
+    if not PSYCOPG2_AVAILABLE:
+        raise RuntimeError("psycopg2 not available; cannot refresh master templates.")
+
+    template = load_local_master_template(template_type, template_name=template_name)
+
+    if cur is not None:
+        try:
+            results = store_local_master_templates(cur, [template], force=force)
+            cur.connection.commit()
+            return results[template['template_type']]
+        except Exception:
+            if not cur.connection.closed:
+                cur.connection.rollback()
+            raise
+
+    conn = None
+    cur = None
+    try:
+        conn = get_pooled_db()
+        cur = conn.cursor()
+        results = store_local_master_templates(cur, [template], force=force)
+        conn.commit()
+        return results[template['template_type']]
     except Exception:
-        if conn:
+        if conn and not conn.closed:
             conn.rollback()
         raise
     finally:
         if cur:
             cur.close()
-        if conn:
-            conn.close()
+        release_pooled_db(conn)
 
 
 def refresh_all_templates_from_local(force=False, template_types=None):
@@ -1325,21 +1694,59 @@ def refresh_all_templates_from_local(force=False, template_types=None):
     errors = {}
 
     allowed_types = set(t.lower() for t in template_types) if template_types else None
+    jobs = [
+        (template_type, config.get('display_name'))
+        for template_type, config in MASTER_TEMPLATE_CONFIG.items()
+        if not allowed_types or template_type in allowed_types
+    ]
+    if not jobs:
+        return results, errors
 
-    for template_type, config in MASTER_TEMPLATE_CONFIG.items():
-        if allowed_types and template_type not in allowed_types:
-            continue
-
-        display_name = config.get('display_name')
-        try:
-            refresh_result = refresh_master_template_from_local(
+    if not PSYCOPG2_AVAILABLE:
+        for template_type, _ in jobs:
+            errors[template_type] = "psycopg2 not available; cannot refresh master templates."
+        return results, errors
+
+    # Templates are independent, so overlap reading and hashing the local PDFs.
+    local_files = get_local_template_dir_index()
+    loaded_templates = []
+    with ThreadPoolExecutor(max_workers=min(TEMPLATE_REFRESH_MAX_WORKERS, len(jobs))) as executor:
+        futures = {
+            executor.submit(
+                load_local_master_template,
                 template_type,
                 template_name=display_name,
-                force=force
-            )
-            results[template_type] = refresh_result
-        except Exception as exc:
-            errors[template_type] = str(exc)
+                local_files=local_files
+            ): template_type
+            for template_type, display_name in jobs
+        }
+        for future in as_completed(futures):
+            template_type = futures[future]
+            try:
+                loaded_templates.append(future.result())
+            except Exception as exc:
+                errors[template_type] = str(exc)
+
+    if not loaded_templates:
+        return results, errors
+
+    # One connection and one transaction for the whole batch.
+    conn = None
+    cur = None
+    try:
+        conn = get_pooled_db()
+        cur = conn.cursor()
+        results = store_local_master_templates(cur, loaded_templates, force=force)
+        conn.commit()
+    except Exception as exc:
+        if conn and not conn.closed:
+            conn.rollback()
+        for template in loaded_templates:
+            errors[template['template_type']] = str(exc)
+    finally:
+        if cur:
+            cur.close()
+        release_pooled_db(conn)
 
     return results, errors
 
@@ -1379,10 +1786,10 @@ def fill_acord25_fields(pdf_bytes, field_values, signature_bytes=None):
 
                     # Debug logging for signature field
                     if is_signature_field:
-                        print(f"[SIGNATURE DEBUG] Found signature field: {normalized_name}")
-                        print(f"[SIGNATURE DEBUG] Value: {value}")
-                        print(f"[SIGNATURE DEBUG] signature_applied: {signature_applied}")
-                        print(f"[SIGNATURE DEBUG] signature_bytes: {signature_bytes is not None}")
+                        print(
+                            f"[SIGNATURE DEBUG] Found signature field: {normalized_name}, value={value}, "
+                            f"signature_applied={signature_applied}, signature_bytes={signature_bytes is not None}"
+                        )
 
                     # Skip empty strings for non-checkbox fields
                     if not is_checkbox_like and str(value).strip() == '':
@@ -1658,11 +2065,157 @@ def database_not_configured_response():
 # Form field helpers
 
 
+def decode_pdf_literal_string(raw):
+    """Decode the body of a PDF literal string such as the contents of (Producer_FullName_A)."""
+    def unescape(match):
+        token = match.group(1)
+        if token[:1].isdigit():
+            return bytes([int(token, 8) & 0xFF])
+        if token in (b'\r\n', b'\n', b'\r'):
+            return b''
+        return PDF_STRING_ESCAPES.get(token, token)
+
+    data = PDF_STRING_ESCAPE_REGEX.sub(unescape, raw)
+    if data.startswith(b'\xfe\xff'):
+        return data[2:].decode('utf-16-be', errors='replace')
+    return data.decode('latin-1')
+
+
+def extract_form_fields_with_regex(pdf_bytes):
+    """
+    Best-effort AcroForm field listing straight from the PDF bytes, without pypdf.
+    Only sees fields stored as plain objects (not inside compressed object streams),
+    and reports partial names for fields nested under a /Parent.
+    PDFs with object streams yield no fields rather than a truncated list that would be cached and persisted.
+    """
+    if b'/ObjStm' in pdf_bytes:
+        print("Warning: regex field scan skipped; PDF stores objects in compressed object streams")
+        return []
+
+    fields = []
+    seen_names = set()
+    for object_match in PDF_OBJECT_REGEX.finditer(pdf_bytes):
+        body = object_match.group(1).strip()
+        if not body.startswith(b'<<'):
+            continue
+        # Drop nested dictionaries (/AA, /MK, ...) so only the field's own keys are matched.
+        body = body[2:]
+        previous = None
+        while previous != body:
+            previous = body
+            body = PDF_NESTED_DICT_REGEX.sub(b' ', body)
+
+        name_match = PDF_FIELD_NAME_REGEX.search(body)
+        if not name_match:
+            continue
+        name = decode_pdf_literal_string(name_match.group(1))
+        if not name or name in seen_names:
+            continue
+        seen_names.add(name)
+
+        type_match = PDF_FIELD_TYPE_REGEX.search(body)
+        flags_match = PDF_FIELD_FLAGS_REGEX.search(body)
+        label_match = PDF_FIELD_LABEL_REGEX.search(body)
+        flags = int(flags_match.group(1)) if flags_match else 0
+
+        default_value = None
+        value_match = PDF_FIELD_VALUE_REGEX.search(body)
+        if value_match:
+            if value_match.group(2) is not None:
+                default_value = '/' + value_match.group(2).decode('latin-1')
+            else:
+                default_value = decode_pdf_literal_string(value_match.group(1))
+
+        rect = None
+        rect_match = PDF_FIELD_RECT_REGEX.search(body)
+        if rect_match:
+            try:
+                coords = [float(coord) for coord in rect_match.group(1).split()]
+                rect = coords if len(coords) == 4 else None
+            except ValueError:
+                rect = None
+
+        fields.append({
+            'name': name,
+            'type': type_match.group(1).decode('latin-1') if type_match else 'text',
+            'label': decode_pdf_literal_string(label_match.group(1)) if label_match else name,
+            'required': bool(flags & 2),
+            'default_value': default_value,
+            'flags': flags,
+            'options': [],
+            'rect': rect,
+        })
+
+    return fields
+
+
+def extract_form_fields_with_pymupdf(pdf_bytes):
+    """Extract AcroForm field metadata with PyMuPDF, in the same shape as the pypdf path."""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        fields = []
+        seen_names = set()
+
+        for page in doc:
+            # Widget rects are in MuPDF (top-left) space; report PDF space like /Rect does
+            to_pdf = ~page.transformation_matrix
+            for widget in page.widgets():
+                name = widget.field_name
+                # Radio groups and repeated fields have one widget per appearance
+                if not name or name in seen_names:
+                    continue
+                seen_names.add(name)
+
+                field_type = PYMUPDF_FIELD_TYPES.get(widget.field_type, 'text')
+                flags = int(widget.field_flags or 0)
+
+                value = widget.field_value
+                if value is None or value == '':
+                    default_value = None
+                elif field_type == 'Btn' and isinstance(value, str):
+                    default_value = value if value.startswith('/') else '/' + value
+                else:
+                    default_value = str(value)
+
+                options = []
+                if field_type == 'Ch' and widget.choice_values:
+                    options = [str(entry) for entry in widget.choice_values]
+
+                rect = None
+                if widget.rect is not None:
+                    pdf_rect = (widget.rect * to_pdf).normalize()
+                    rect = [float(pdf_rect.x0), float(pdf_rect.y0), float(pdf_rect.x1), float(pdf_rect.y1)]
+
+                fields.append({
+                    'name': name,
+                    'type': field_type,
+                    'label': widget.field_label or name,
+                    'required': bool(flags & 2),
+                    'default_value': default_value,
+                    'flags': flags,
+                    'options': options,
+                    'rect': rect,
+                })
+
+        return fields
+    finally:
+        doc.close()
+
+
 def extract_form_fields_from_pdf_bytes(pdf_bytes):
-    """Extract AcroForm field metadata from PDF bytes."""
-    if not PYPDF_AVAILABLE or not pdf_bytes:
+    """Extract AcroForm field metadata from PDF bytes (PyMuPDF, then pypdf, then the regex scan)."""
+    if not pdf_bytes:
         return []
 
+    if PYMUPDF_AVAILABLE:
+        try:
+            return extract_form_fields_with_pymupdf(pdf_bytes)
+        except Exception as exc:
+            print(f"Warning: PyMuPDF field extraction failed, falling back to pypdf ({exc})")
+
+    if not PYPDF_AVAILABLE:
+        return extract_form_fields_with_regex(pdf_bytes)
+
     try:
         reader = PdfReader(io.BytesIO(pdf_bytes))
         field_map = reader.get_fields() or {}
@@ -1672,24 +2225,24 @@ def extract_form_fields_from_pdf_bytes(pdf_bytes):
             if not name:
                 continue
 
-            field_type = str(data.get('/FT', '')).strip('/') or 'text'
-            flags = int(data.get('/Ff', 0))
-            options = []
-            if '/Opt' in data:
-                opt_values = data.get('/Opt') or []
-                if isinstance(opt_values, (list, tuple)):
-                    for entry in opt_values:
-                        options.append(str(entry))
-                else:
-                    options.append(str(opt_values))
+            # Bind the lookup once; ACORD forms have hundreds of fields per document.
+            get = data.get
+            field_type = str(get('/FT', '')).strip('/') or 'text'
+            flags = int(get('/Ff') or 0)
 
-            if '/V' in data and data.get('/V') is not None:
-                default_value = str(data.get('/V'))
+            opt_values = get('/Opt')
+            if not opt_values:
+                options = []
+            elif isinstance(opt_values, (list, tuple)):
+                options = [str(entry) for entry in opt_values]
             else:
-                default_value = None
+                options = [str(opt_values)]
+
+            value = get('/V')
+            default_value = str(value) if value is not None else None
 
             rect = None
-            raw_rect = data.get('/Rect')
+            raw_rect = get('/Rect')
             if isinstance(raw_rect, (list, tuple)) and len(raw_rect) == 4:
                 try:
                     rect = [float(coord) for coord in raw_rect]
@@ -1698,8 +2251,8 @@ def extract_form_fields_from_pdf_bytes(pdf_bytes):
 
             fields.append({
                 'name': str(name),
-                'type': field_type or 'text',
-                'label': str(data.get('/TU') or data.get('/T') or name),
+                'type': field_type,
+                'label': str(get('/TU') or get('/T') or name),
                 'required': bool(flags & 2),
                 'default_value': default_value,
                 'flags': flags,
@@ -1710,8 +2263,46 @@ def extract_form_fields_from_pdf_bytes(pdf_bytes):
         return fields
     except Exception as exc:
         print(f"Warning: unable to extract form fields automatically ({exc})")
+        return extract_form_fields_with_regex(pdf_bytes)
+
+
+def get_master_template_form_fields(template_type, pdf_bytes):
+    """Return form fields for a master template, reusing the cached extraction when the PDF is unchanged."""
+    if not pdf_bytes:
         return []
 
+    template_key = normalize_template_key(template_type)
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    cached = MASTER_TEMPLATE_FIELD_CACHE.get(template_key)
+    if cached and cached[0] == digest:
+        return list(cached[1])
+
+    fields = extract_form_fields_from_pdf_bytes(pdf_bytes)
+    if fields:
+        MASTER_TEMPLATE_FIELD_CACHE[template_key] = (digest, fields)
+    return list(fields)
+
+
+def extract_master_template_fields_batch(templates):
+    """
+    Return {template_type: fields} for loaded local templates, reusing cached extractions.
+    Misses are extracted serially: this runs inside requests, so no worker processes are forked here.
+    """
+    fields_by_type = {}
+    for template in templates:
+        template_key = normalize_template_key(template['template_type'])
+        cached = MASTER_TEMPLATE_FIELD_CACHE.get(template_key)
+        if cached and cached[0] == template['pdf_sha256']:
+            fields_by_type[template['template_type']] = list(cached[1])
+            continue
+
+        fields = extract_form_fields_from_pdf_bytes(read_local_master_template_bytes(template))
+        if fields:
+            MASTER_TEMPLATE_FIELD_CACHE[template_key] = (template['pdf_sha256'], fields)
+        fields_by_type[template['template_type']] = list(fields)
+
+    return fields_by_type
+
 
 def coerce_form_fields_payload(raw):
     """Normalize stored form field data into a dictionary with a fields list."""
@@ -1825,8 +2416,11 @@ def serve_static(path):
     except Exception as e:
         return f"File not found: {path}", 404
 
-@app.route("/api/health")
+@app.route("/api/health", methods=['GET', 'HEAD'])
 def health():
+    # Liveness probes only need the status line; skip building the JSON body
+    if request.method == 'HEAD':
+        return '', 200
     return jsonify({
         "status": "healthy",
         "message": "Acords Management System is working",
@@ -1845,25 +2439,104 @@ def get_config():
         "adobeClientId": os.environ.get('REACT_APP_ADOBE_CLIENT_ID', '')
     })
 
+# Upper bound on an inflated gzip request body, so a small compressed upload cannot exhaust a worker.
+MAX_INFLATED_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+def get_request_json_payload():
+    """
+    Parse the JSON request body, inflating it first when sent with Content-Encoding: gzip.
+    Returns (payload, error); error is set when a body was sent but cannot be decoded.
+    """
+    if not request.is_json:
+        return None, None
+
+    raw_body = request.get_data(cache=False)
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        try:
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            raw_body = inflater.decompress(raw_body, MAX_INFLATED_REQUEST_BYTES + 1)
+        except zlib.error as e:
+            return None, f'Invalid gzip request body: {e}'
+        if len(raw_body) > MAX_INFLATED_REQUEST_BYTES or inflater.unconsumed_tail:
+            return None, f'Request body exceeds {MAX_INFLATED_REQUEST_BYTES} bytes once decompressed'
+        if not inflater.eof:
+            return None, 'Invalid gzip request body: truncated stream'
+
+    if not raw_body:
+        return None, None
+    try:
+        payload = json.loads(raw_body)
+    except ValueError as e:
+        return None, f'Invalid JSON request body: {e}'
+    if not isinstance(payload, dict):
+        return None, 'JSON request body must be an object'
+    return payload, None
+
 @app.route("/api/setup", methods=['POST'])
 @require_sf_session
 def setup_system():
     """Initialize Supabase storage and database schema"""
     try:
+        payload, payload_error = get_request_json_payload()
+        if payload_error:
+            return jsonify({'success': False, 'error': payload_error}), 400
+        payload = payload or {}
+
         # Check if this is a SQL execution request
-        if request.is_json and request.json.get('action') == 'create_tables':
-            sql = request.json.get('sql')
+        if payload.get('action') == 'create_tables':
+            sql = payload.get('sql')
             if sql:
+                conn = None
+                cur = None
                 try:
                     conn = get_db()
                     cur = conn.cursor()
                     cur.execute(sql)
                     conn.commit()
-                    cur.close()
-                    conn.close()
                     return jsonify({'success': True, 'message': 'SQL executed successfully'})
                 except Exception as e:
+                    if conn:
+                        conn.rollback()
                     return jsonify({'success': False, 'error': f'SQL execution failed: {str(e)}'}), 500
+                finally:
+                    if cur:
+                        cur.close()
+                    if conn:
+                        conn.close()
+
+            # A list of statements runs in one request and one transaction
+            sql_batch = payload.get('sql_batch')
+            if isinstance(sql_batch, list) and sql_batch:
+                conn = None
+                cur = None
+                statement_index = 0
+                try:
+                    conn = get_db()
+                    cur = conn.cursor()
+                    statement_results = []
+                    for statement_index, statement in enumerate(sql_batch):
+                        cur.execute(statement)
+                        statement_results.append({'index': statement_index, 'rowcount': cur.rowcount})
+                    conn.commit()
+                    return jsonify({
+                        'success': True,
+                        'message': f'Executed {len(sql_batch)} SQL statements in one transaction',
+                        'results': statement_results
+                    })
+                except Exception as e:
+                    if conn:
+                        conn.rollback()
+                    return jsonify({
+                        'success': False,
+                        'error': f'SQL execution failed: {str(e)}',
+                        'failed_index': statement_index
+                    }), 500
+                finally:
+                    if cur:
+                        cur.close()
+                    if conn:
+                        conn.close()
         
         # Original setup functionality
         results = {}
@@ -1879,9 +2552,8 @@ def setup_system():
         if PSYCOPG2_AVAILABLE:
             db_result = create_database_schema()
             results['database_schema'] = db_result
-            # Run migrations to add new columns
-            ensure_generated_certificates_table()
-            results['generated_certificates_migration'] = True
+            # The generated_certificates migration runs inside the schema transaction
+            results['generated_certificates_migration'] = db_result
         else:
             results['database_schema'] = False
 
@@ -1958,13 +2630,13 @@ def get_account_templates(account_id):
             ORDER BY template_name
         '''
 
-        def fetch_templates():
+        def fetch_templates(sql=query):
             connection = None
             cursor = None
             try:
                 connection = get_db()
                 cursor = connection.cursor()
-                cursor.execute(query)
+                cursor.execute(sql)
                 return cursor.fetchall()
             finally:
                 if cursor:
@@ -1972,6 +2644,18 @@ def get_account_templates(account_id):
                 if connection:
                     connection.close()
 
+        # ?count_only=1 returns just the number of templates the full listing would contain,
+        # without pulling form_fields JSONB for every row.
+        if str(request.args.get('count_only', '')).strip().lower() in ('1', 'true', 'yes'):
+            type_rows = fetch_templates('SELECT LOWER(TRIM(template_type)) AS template_type FROM master_templates')
+            stored_types = {row.get('template_type') for row in type_rows if row and row.get('template_type')}
+            missing_count = sum(1 for template_key in MASTER_TEMPLATE_CONFIG if template_key not in stored_types)
+            return jsonify({
+                'success': True,
+                'account_id': account_id,
+                'count': len(type_rows) + missing_count
+            })
+
         templates = fetch_templates()
 
         existing_types = set()
@@ -3046,6 +3730,7 @@ def process_certificate_generation_request(account_id, payload, default_template
         conn = get_db()
         cur = conn.cursor()
 
+        certificate_rows = []
         for entry in generated_files:
             holder_key = entry.get('holder_id')
             filename = entry.get('filename')
@@ -3059,28 +3744,35 @@ def process_certificate_generation_request(account_id, payload, default_template
                 file_path.write_bytes(pdf_bytes)
                 local_path = str(file_path.relative_to(LOCAL_TEMPLATE_DIR.parent))
 
-            print(f"[Generated Certs INSERT] account={normalized_account_id}, holder={holder_key}, template={template_id}, filename={filename}")
-            cur.execute(
-                '''
-                INSERT INTO generated_certificates (
-                    id, account_id, template_id, certificate_holder_id, filename, storage_path, pdf_blob, generated_at
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
-                RETURNING id
-                ''',
-                (
-                    str(uuid.uuid4()),
-                    normalized_account_id,
-                    template_id,
-                    holder_key,
-                    filename,
-                    local_path,
-                    psycopg2.Binary(pdf_bytes) if PSYCOPG2_AVAILABLE else None
-                )
-            )
-            inserted_id = cur.fetchone()
-            print(f"[Generated Certs INSERT] Successfully inserted ID: {inserted_id}")
+            certificate_rows.append((
+                str(uuid.uuid4()),
+                normalized_account_id,
+                template_id,
+                holder_key,
+                filename,
+                local_path,
+                psycopg2.Binary(pdf_bytes) if PSYCOPG2_AVAILABLE else None
+            ))
+
+        # One multi-row INSERT for the whole batch instead of a round trip per certificate
+        inserted = execute_values(
+            cur,
+            '''
+            INSERT INTO generated_certificates (
+                id, account_id, template_id, certificate_holder_id, filename, storage_path, pdf_blob, generated_at
+            ) VALUES %s
+            RETURNING id
+            ''',
+            certificate_rows,
+            template='(%s, %s, %s, %s, %s, %s, %s, NOW())',
+            fetch=True
+        )
         conn.commit()
-        print(f"[Generated Certs INSERT] Committed {len(generated_files)} certificates to database")
+        inserted_ids = [row['id'] for row in inserted]
+        print(
+            f"[Generated Certs INSERT] account={normalized_account_id}: "
+            f"committed {len(inserted_ids)} certificate(s): {', '.join(str(i) for i in inserted_ids)}"
+        )
     except Exception as store_error:
         print(f"ERROR: unable to persist generated certificates: {store_error}")
         import traceback
@@ -3431,83 +4123,188 @@ def provision_pdf():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route("/api/upload-template", methods=['POST'])
-@require_sf_session
-def upload_template():
-    """Upload a master template and persist it in Postgres (Supabase optional)."""
+def find_uploaded_master_template(template_name, pdf_sha256):
+    """Return the master_templates row already holding this exact PDF under this name, if any."""
+    conn = None
+    cur = None
     try:
-        if 'file' not in request.files:
-            return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+        conn = get_pooled_db()
+        cur = conn.cursor()
+        if not ensure_pdf_sha256_column(cur):
+            return None
+        cur.execute(
+            '''
+            SELECT id, template_name, template_type, storage_path, file_size
+            FROM master_templates
+            WHERE template_name = %s AND pdf_sha256 = %s
+            LIMIT 1
+            ''',
+            (template_name, pdf_sha256)
+        )
+        return cur.fetchone()
+    except Exception as lookup_error:
+        print(f"Warning: duplicate upload check failed: {lookup_error}")
+        return None
+    finally:
+        if cur:
+            cur.close()
+        release_pooled_db(conn)
 
-        pdf_file = request.files['file']
-        template_name = request.form.get('name', 'Untitled Template')
-        template_type = request.form.get('template_type', 'general')
-        account_id = request.form.get('account_id', 'system')
 
-        template_id = str(uuid.uuid4())
-        pdf_data = pdf_file.read()
-        if not pdf_data:
-            return jsonify({'success': False, 'error': 'Uploaded file is empty'}), 400
+def upload_precondition_failed_response(template_name):
+    """
+    Return a 412 when the client's If-None-Match names the SHA-256 already stored for this template
+    (RFC 9110: a matching If-None-Match on a POST fails the precondition). Returns None otherwise.
+    """
+    for digest in request.if_none_match.as_set():
+        if find_uploaded_master_template(template_name, digest):
+            response = make_response('', 412)
+            response.set_etag(digest)
+            return response
+    return None
 
-        storage_path = f'db://master_templates/{template_id}.pdf'
 
-        if supabase:
+def unchanged_upload_response(existing, pdf_sha256):
+    """Response for a re-upload whose bytes match the stored template."""
+    response = jsonify({
+        'success': True,
+        'template_id': str(existing['id']),
+        'message': 'Template unchanged; existing upload reused',
+        'unchanged': True,
+        'metadata': {
+            'name': existing['template_name'],
+            'type': existing['template_type'],
+            'storage_path': existing['storage_path'],
+            'file_size': existing['file_size']
+        }
+    })
+    response.set_etag(pdf_sha256)
+    return response
+
+
+def upload_template_to_supabase_storage(storage_path, pdf_data):
+    """Copy an uploaded template PDF into Supabase Storage, trying the last bucket that worked first."""
+    global supabase_template_bucket
+    try:
+        storage = get_supabase_storage()
+        bucket_names = SUPABASE_TEMPLATE_BUCKETS
+        if supabase_template_bucket:
+            bucket_names = (supabase_template_bucket,) + tuple(
+                name for name in SUPABASE_TEMPLATE_BUCKETS if name != supabase_template_bucket
+            )
+        for bucket_name in bucket_names:
             try:
-                bucket_names = ['certificates', 'files', 'templates', 'default']
-                for bucket_name in bucket_names:
-                    try:
-                        supabase.storage.from_(bucket_name).upload(
-                            storage_path,
-                            pdf_data,
-                            {'content-type': 'application/pdf', 'upsert': 'true'}
-                        )
-                        print(f"Uploaded template to Supabase bucket {bucket_name}")
-                        break
-                    except Exception as exc:
-                        print(f"Supabase upload to {bucket_name} failed: {exc}")
-            except Exception as supabase_error:
-                print(f"Supabase upload skipped due to error: {supabase_error}")
+                storage.from_(bucket_name).upload(
+                    storage_path,
+                    pdf_data,
+                    {'content-type': 'application/pdf', 'upsert': 'true'}
+                )
+                supabase_template_bucket = bucket_name
+                print(f"Uploaded template to Supabase bucket {bucket_name}")
+                break
+            except Exception as exc:
+                print(f"Supabase upload to {bucket_name} failed: {exc}")
+    except Exception as supabase_error:
+        print(f"Supabase upload skipped due to error: {supabase_error}")
+
+
+def build_master_template_insert(template_id, template_name, template_type, storage_path, pdf_data, pdf_sha256):
+    """Return (columns, values) for inserting an uploaded master template; form_fields is filled on first extraction."""
+    columns = ['id', 'template_name', 'template_type', 'storage_path', 'file_size', 'pdf_blob', 'form_fields']
+    values = [
+        template_id,
+        template_name,
+        template_type,
+        storage_path,
+        len(pdf_data),
+        psycopg2.Binary(pdf_data),
+        None
+    ]
+    if PDF_SHA256_COLUMN_AVAILABLE:
+        columns.append('pdf_sha256')
+        values.append(pdf_sha256)
+    return columns, values
 
-        try:
-            conn = get_db()
-            cur = conn.cursor()
 
-            cur.execute('''
-                INSERT INTO master_templates (id, template_name, template_type, storage_path, file_size, pdf_blob, form_fields)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                RETURNING *
-            ''', (
-                template_id,
-                template_name,
-                template_type,
-                storage_path,
-                len(pdf_data),
-                psycopg2.Binary(pdf_data),
-                Json({})
-            ))
+def save_uploaded_master_template(success_message, upload_to_storage=False):
+    """Shared body of the template upload endpoints: validate, dedupe, optionally mirror to Supabase, insert."""
+    # A ?name= query parameter lets the If-None-Match check run before werkzeug parses the multipart body.
+    template_name = request.args.get('name') or request.form.get('name', 'Untitled Template')
+    precondition_failed = upload_precondition_failed_response(template_name)
+    if precondition_failed:
+        return precondition_failed
 
-            result = cur.fetchone()
-            conn.commit()
+    if 'file' not in request.files:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+
+    pdf_file = request.files['file']
+    template_type = request.form.get('template_type', 'general')
+
+    template_id = str(uuid.uuid4())
+    pdf_data = pdf_file.read()
+    if not pdf_data:
+        return jsonify({'success': False, 'error': 'Uploaded file is empty'}), 400
+
+    # Identical re-uploads skip the storage PUT and the blob rewrite.
+    pdf_sha256 = hashlib.sha256(pdf_data).hexdigest()
+    existing = find_uploaded_master_template(template_name, pdf_sha256)
+    if existing:
+        return unchanged_upload_response(existing, pdf_sha256)
+
+    storage_path = f'db://master_templates/{template_id}.pdf'
+
+    if upload_to_storage and supabase:
+        upload_template_to_supabase_storage(storage_path, pdf_data)
+
+    conn = None
+    cur = None
+    try:
+        conn = get_db()
+        cur = conn.cursor()
+
+        columns, values = build_master_template_insert(
+            template_id, template_name, template_type, storage_path, pdf_data, pdf_sha256
+        )
+
+        # RETURNING only the id; the caller already has the row and the PDF need not travel back.
+        cur.execute(f'''
+            INSERT INTO master_templates ({', '.join(columns)})
+            VALUES ({', '.join(['%s'] * len(columns))})
+            RETURNING id
+        ''', values)
+        conn.commit()
+
+        response = jsonify({
+            'success': True,
+            'template_id': template_id,
+            'message': success_message,
+            'metadata': {
+                'name': template_name,
+                'type': template_type,
+                'storage_path': storage_path,
+                'file_size': len(pdf_data)
+            }
+        })
+        response.set_etag(pdf_sha256)
+        return response
+
+    except Exception as db_error:
+        if conn:
+            conn.rollback()
+        return jsonify({'success': False, 'error': f'Database save failed: {str(db_error)}'}), 500
+    finally:
+        if cur:
             cur.close()
+        if conn:
             conn.close()
 
-            return jsonify({
-                'success': True,
-                'template_id': template_id,
-                'message': 'Template uploaded successfully',
-                'metadata': {
-                    'name': template_name,
-                    'type': template_type,
-                    'storage_path': storage_path,
-                    'file_size': len(pdf_data)
-                }
-            })
-
-        except Exception as db_error:
-            if 'conn' in locals() and conn:
-                conn.rollback()
-            return jsonify({'success': False, 'error': f'Database save failed: {str(db_error)}'}), 500
 
+@app.route("/api/upload-template", methods=['POST'])
+@require_sf_session
+def upload_template():
+    """Upload a master template and persist it in Postgres (Supabase optional)."""
+    try:
+        return save_uploaded_master_template('Template uploaded successfully', upload_to_storage=True)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -3516,70 +4313,148 @@ def upload_template():
 def upload_template_simple():
     """Simple template upload that stores the PDF in Postgres."""
     try:
-        if 'file' not in request.files:
-            return jsonify({'success': False, 'error': 'No file uploaded'}), 400
-
-        pdf_file = request.files['file']
-        template_name = request.form.get('name', 'Untitled Template')
-        template_type = request.form.get('template_type', 'general')
-        account_id = request.form.get('account_id', 'system')
+        return save_uploaded_master_template('Template saved successfully')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        template_id = str(uuid.uuid4())
-        pdf_data = pdf_file.read()
-        if not pdf_data:
-            return jsonify({'success': False, 'error': 'Uploaded file is empty'}), 400
+@app.route("/api/upload-templates-batch", methods=['POST'])
+@require_sf_session
+def upload_templates_batch():
+    """
+    Upload several master templates in one multipart request and store them in Postgres.
+    Send repeated 'file' parts with matching 'name' / 'template_type' values (by position).
+    Same conflict policy as the single upload: identical re-uploads are reported unchanged,
+    and a name that already holds a different PDF is rejected rather than replaced.
+    """
+    try:
+        pdf_files = request.files.getlist('file')
+        if not pdf_files:
+            return jsonify({'success': False, 'error': 'No files uploaded'}), 400
+
+        names = request.form.getlist('name')
+        template_types = request.form.getlist('template_type')
+
+        results = []
+        pending = []
+        seen_names = set()
+        for index, pdf_file in enumerate(pdf_files):
+            template_name = (names[index] if index < len(names) else '') or Path(pdf_file.filename or '').stem or 'Untitled Template'
+            template_type = (template_types[index] if index < len(template_types) else '') or 'general'
+            pdf_data = pdf_file.read()
+            if not pdf_data:
+                results.append({'name': template_name, 'success': False, 'error': 'Uploaded file is empty'})
+                continue
+            if template_name in seen_names:
+                results.append({'name': template_name, 'success': False, 'error': 'Duplicate template name in batch'})
+                continue
+            seen_names.add(template_name)
+            pending.append({
+                'name': template_name,
+                'type': template_type,
+                'pdf_data': pdf_data,
+                'pdf_sha256': hashlib.sha256(pdf_data).hexdigest()
+            })
 
-        storage_path = f'db://master_templates/{template_id}.pdf'
+        if not pending:
+            return jsonify({'success': False, 'results': results, 'error': 'No valid files uploaded'}), 400
 
+        conn = None
+        cur = None
         try:
             conn = get_db()
             cur = conn.cursor()
+            sha256_supported = ensure_pdf_sha256_column(cur)
 
-            cur.execute('''
-                INSERT INTO master_templates (id, template_name, template_type, storage_path, file_size, pdf_blob, form_fields)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                RETURNING *
-            ''', (
-                template_id,
-                template_name,
-                template_type,
-                storage_path,
-                len(pdf_data),
-                psycopg2.Binary(pdf_data),
-                Json({})
-            ))
-
-            result = cur.fetchone()
-            conn.commit()
-            cur.close()
-            conn.close()
+            # One lookup for the whole batch; unchanged templates are skipped, changed ones rejected.
+            cur.execute(
+                f'''
+                SELECT id, template_name{', pdf_sha256' if sha256_supported else ''}
+                FROM master_templates
+                WHERE template_name = ANY(%s)
+                ''',
+                ([entry['name'] for entry in pending],)
+            )
+            existing_by_name = {row['template_name']: row for row in cur.fetchall()}
+
+            columns = None
+            rows = []
+            for entry in pending:
+                existing = existing_by_name.get(entry['name'])
+                if existing and sha256_supported and existing['pdf_sha256'] == entry['pdf_sha256']:
+                    results.append({'name': entry['name'], 'success': True, 'unchanged': True, 'template_id': str(existing['id'])})
+                    continue
+                if existing:
+                    results.append({'name': entry['name'], 'success': False, 'error': 'A template with this name already exists'})
+                    continue
+                template_id = str(uuid.uuid4())
+                columns, values = build_master_template_insert(
+                    template_id,
+                    entry['name'],
+                    entry['type'],
+                    f'db://master_templates/{template_id}.pdf',
+                    entry['pdf_data'],
+                    entry['pdf_sha256']
+                )
+                rows.append(values)
 
-            return jsonify({
-                'success': True,
-                'template_id': template_id,
-                'message': 'Template saved successfully',
-                'metadata': {
-                    'name': template_name,
-                    'type': template_type,
-                    'storage_path': storage_path,
-                    'file_size': len(pdf_data)
-                }
-            })
+            if rows:
+                # DO NOTHING keeps a concurrently inserted name intact; it is reported as a conflict below.
+                stored = execute_values(
+                    cur,
+                    f'''
+                    INSERT INTO master_templates ({', '.join(columns)})
+                    VALUES %s
+                    ON CONFLICT (template_name) DO NOTHING
+                    RETURNING id, template_name, storage_path, file_size
+                    ''',
+                    rows,
+                    fetch=True
+                )
+                stored_names = set()
+                for row in stored:
+                    stored_names.add(row['template_name'])
+                    results.append({
+                        'name': row['template_name'],
+                        'success': True,
+                        'template_id': str(row['id']),
+                        'storage_path': row['storage_path'],
+                        'file_size': row['file_size']
+                    })
+                for values in rows:
+                    if values[1] not in stored_names:
+                        results.append({'name': values[1], 'success': False, 'error': 'A template with this name already exists'})
 
+            conn.commit()
         except Exception as db_error:
-            if 'conn' in locals() and conn:
+            if conn:
                 conn.rollback()
-            return jsonify({'success': False, 'error': f'Database save failed: {str(db_error)}'}), 500
+            return jsonify({'success': False, 'results': results, 'error': f'Database save failed: {str(db_error)}'}), 500
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                conn.close()
+
+        return jsonify({
+            'success': all(result['success'] for result in results),
+            'uploaded': sum(1 for result in results if result['success'] and not result.get('unchanged')),
+            'unchanged': sum(1 for result in results if result.get('unchanged')),
+            'results': results
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 
+# Checkbox vocabularies, built once at import; these helpers run for every field of every fill.
+CHECKBOX_TRUE_VALUES = frozenset({"true", "1", "yes", "on", "checked", "x"})
+CHECKBOX_FALSE_VALUES = frozenset({"false", "0", "no", "off", "unchecked"})
+CHECKBOX_NAME_TOKENS = ('indicator', 'checkbox', 'check', 'box')
+
+
 def resolve_checkbox_state(saved_value):
     '''Return (pdf_state, field_state) tuples for checkbox-like fields.'''
-    true_values = {"true", "1", "yes", "on", "checked", "x"}
-    false_values = {"false", "0", "no", "off", "unchecked"}
 
     if isinstance(saved_value, bool):
         return ('/Yes' if saved_value else '/Off', 'Yes' if saved_value else 'Off')
@@ -3596,9 +4471,9 @@ def resolve_checkbox_state(saved_value):
         return f'/{core}', core
 
     lowered = value_str.lower()
-    if lowered in true_values:
+    if lowered in CHECKBOX_TRUE_VALUES:
         return '/Yes', 'Yes'
-    if lowered in false_values:
+    if lowered in CHECKBOX_FALSE_VALUES:
         return '/Off', 'Off'
 
     return f'/{value_str}', value_str
@@ -3611,8 +4486,7 @@ def is_checkbox_field_name(field_name):
     field_lower = str(field_name).strip().lower()
     if field_lower.endswith('text'):
         return False
-    checkbox_tokens = {'indicator', 'checkbox', 'check', 'box'}
-    return any(token in field_lower for token in checkbox_tokens)
+    return any(token in field_lower for token in CHECKBOX_NAME_TOKENS)
 
 
 def normalize_checkbox_value(value):
@@ -3808,6 +4682,12 @@ def fill_checkboxes_with_pypdf(pdf_bytes, checkbox_values):
 
 
 
+@lru_cache(maxsize=256)
+def normalize_local_template_stem(stem):
+    """Map a stored file stem such as 'acord_25' onto the bundled filename stem ('acord25')."""
+    return stem.replace('acord_', 'acord').replace('_', '').lower()
+
+
 def resolve_local_template_file(template_type, storage_path):
     """Resolve a local PDF template file path if available."""
     candidates = []
@@ -3818,7 +4698,7 @@ def resolve_local_template_file(template_type, storage_path):
             candidate = Path(storage_path)
             candidates.append(candidate)
             candidates.append(Path(__file__).resolve().parent / storage_path)
-            normalized_name = candidate.stem.replace('acord_', 'acord').replace('_', '').lower()
+            normalized_name = normalize_local_template_stem(candidate.stem)
             if normalized_name:
                 candidates.append(LOCAL_TEMPLATE_DIR / f"{normalized_name}.pdf")
             candidates.append(LOCAL_TEMPLATE_DIR / candidate.name)
@@ -3829,9 +4709,17 @@ def resolve_local_template_file(template_type, storage_path):
         if mapped:
             candidates.append(LOCAL_TEMPLATE_DIR / mapped)
 
+    # Candidates inside the template directory are answered from the cached listing, not a stat each.
+    local_files = get_local_template_dir_index()
     for candidate in candidates:
         try:
-            if candidate and candidate.exists():
+            if not candidate:
+                continue
+            if candidate.parent == LOCAL_TEMPLATE_DIR:
+                local_file = local_files.get(candidate.name.lower())
+                if local_file:
+                    return local_file
+            elif candidate.exists():
                 return candidate
         except TypeError:
             continue
@@ -3957,7 +4845,8 @@ def fetch_template_row(cur, template_identifier, account_id=None, include_field_
         try:
             refresh_master_template_from_local(
                 normalized_key,
-                template_name=config.get('display_name')
+                template_name=config.get('display_name'),
+                cur=cur
             )
             row = execute_with_optional_pdf_blob(
                 cur,
@@ -4145,13 +5034,13 @@ def serve_pdf_template(template_id):
 
         # Attempt to extract and persist form field metadata if missing and DB is available
         if cur and conn and template and not form_fields_payload.get('fields') and pdf_content:
-            extracted_fields = extract_form_fields_from_pdf_bytes(pdf_content)
+            extracted_fields = get_master_template_form_fields(template_type or normalized_template_key, pdf_content)
             if extracted_fields:
                 try:
                     form_fields_payload = enrich_form_fields_payload({'fields': extracted_fields}, method='pypdf-auto')
                     cur.execute(
                         'UPDATE master_templates SET form_fields = %s, updated_at = NOW() WHERE id = %s',
-                        (Json(form_fields_payload), template_id_for_update)
+                        (Json(form_fields_payload, dumps=dumps_json), template_id_for_update)
                     )
                     conn.commit()
                     print(f"Extracted and stored {len(extracted_fields)} form fields for template {template_id_str}")
@@ -4264,7 +5153,8 @@ def serve_pdf_template_with_fields(template_id, account_id):
                 try:
                     refresh_master_template_from_local(
                         normalized_template_key,
-                        template_name=MASTER_TEMPLATE_CONFIG[normalized_template_key].get('display_name')
+                        template_name=MASTER_TEMPLATE_CONFIG[normalized_template_key].get('display_name'),
+                        cur=cur
                     )
                     result = execute_with_optional_pdf_blob(
                         cur,
@@ -4563,6 +5453,8 @@ def serve_pdf_template_with_fields(template_id, account_id):
 @require_sf_session
 def debug_pymupdf_test(template_id, account_id):
     '''Run a small PyMuPDF fill test and return diagnostic information.'''
+    conn = None
+    cur = None
     try:
         conn = get_db()
         cur = conn.cursor()
@@ -4775,8 +5667,9 @@ def debug_pymupdf_test(template_id, account_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        if 'conn' in locals():
+        if cur:
             cur.close()
+        if conn:
             conn.close()
 
 
@@ -4786,6 +5679,8 @@ def debug_pymupdf_test(template_id, account_id):
 @require_sf_session
 def debug_pdf_prefill(template_id, account_id):
     """Debug endpoint to test PDF pre-filling logic"""
+    conn = None
+    cur = None
     try:
         conn = get_db()
         cur = conn.cursor()
@@ -4845,14 +5740,17 @@ def debug_pdf_prefill(template_id, account_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        if 'conn' in locals():
+        if cur:
             cur.close()
+        if conn:
             conn.close()
 
 @app.route('/api/debug/database', methods=['GET'])
 @require_sf_session
 def debug_database():
     """Debug endpoint to check database contents"""
+    conn = None
+    cur = None
     try:
         conn = get_db()
         cur = conn.cursor()
@@ -4890,8 +5788,9 @@ def debug_database():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        if 'conn' in locals():
+        if cur:
             cur.close()
+        if conn:
             conn.close()
 
 @app.route('/api/pdf/save-fields', methods=['POST'])
@@ -4901,6 +5800,8 @@ def save_pdf_fields():
     print("=== SAVE PDF FIELDS CALLED ===")
     print(f"Request method: {request.method}")
     print(f"Request content type: {request.content_type}")
+    conn = None
+    cur = None
     try:
         data = request.get_json()
         if not isinstance(data, dict):
@@ -4965,12 +5866,13 @@ def save_pdf_fields():
                             print(f"Found {len(fields_dict)} fields using get_fields()")
                             for field_name, field_obj in fields_dict.items():
                                 field_value = ''
-                                # For checkboxes, prioritize /AS (appearance state) over /V (value)
-                                # because /AS contains /Off, /Yes, /1, etc.
-                                if hasattr(field_obj, 'get') and field_obj.get('/AS'):
-                                    field_value = str(field_obj.get('/AS'))
-                                elif hasattr(field_obj, 'get') and field_obj.get('/V'):
-                                    field_value = str(field_obj.get('/V'))
+                                get = getattr(field_obj, 'get', None)
+                                if get is not None:
+                                    # For checkboxes, prioritize /AS (appearance state) over /V (value)
+                                    # because /AS contains /Off, /Yes, /1, etc.
+                                    raw_value = get('/AS') or get('/V')
+                                    if raw_value:
+                                        field_value = str(raw_value)
                                 extracted_fields[field_name] = field_value
                         else:
                             print("No fields found using get_fields()")
@@ -5172,14 +6074,14 @@ def save_pdf_fields():
                 UPDATE template_data
                 SET field_values = %s, updated_at = NOW(), version = version + 1
                 WHERE account_id = %s AND template_id = %s
-            ''', (json.dumps(merged_field_values), account_id, resolved_template_id_str))
+            ''', (dumps_json(merged_field_values), account_id, resolved_template_id_str))
             print(f"UPDATE query executed, affected rows: {cur.rowcount}")
         else:
             print(f"Inserting new template_data record for account {account_id}, template {resolved_template_id_str}")
             cur.execute('''
                 INSERT INTO template_data (account_id, template_id, field_values)
                 VALUES (%s, %s, %s)
-            ''', (account_id, resolved_template_id_str, json.dumps(merged_field_values)))
+            ''', (account_id, resolved_template_id_str, dumps_json(merged_field_values)))
             print(f"INSERT query executed, affected rows: {cur.rowcount}")
 
         template_fields_updated = False
@@ -5190,7 +6092,7 @@ def save_pdf_fields():
             if existing_fields != form_fields_payload:
                 cur.execute(
                     'UPDATE master_templates SET form_fields = %s, updated_at = NOW() WHERE id = %s',
-                    (Json(form_fields_payload), resolved_template_id_str)
+                    (Json(form_fields_payload, dumps=dumps_json), resolved_template_id_str)
                 )
                 template_fields_updated = True
 
@@ -5230,8 +6132,9 @@ def save_pdf_fields():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
-        if 'conn' in locals():
+        if cur:
             cur.close()
+        if conn:
             conn.close()
 
 
@@ -5241,17 +6144,16 @@ def extract_pdf_fields():
     """Extract field values from PDF blob using pypdf"""
     try:
         # Handle both FormData (from save callback) and JSON (from polling)
+        data = None if request.files else request.get_json(silent=True)
         if request.files and 'pdf' in request.files:
-            # FormData from save callback
-            pdf_file = request.files['pdf']
-            pdf_bytes = pdf_file.read()
-        elif request.get_json() and 'pdf_content' in request.get_json():
+            # FormData from save callback: pypdf reads the upload stream directly, no bytes copy
+            pdf_stream = request.files['pdf'].stream
+        elif data and 'pdf_content' in data:
             # JSON from polling (legacy)
-            data = request.get_json()
             pdf_content = data['pdf_content']
             if pdf_content.startswith('data:application/pdf;base64,'):
                 pdf_content = pdf_content.split(',')[1]
-            pdf_bytes = base64.b64decode(pdf_content)
+            pdf_stream = io.BytesIO(base64.b64decode(pdf_content))
         else:
             return jsonify({'success': False, 'error': 'No PDF content provided'}), 400
         
@@ -5259,7 +6161,7 @@ def extract_pdf_fields():
             return jsonify({'success': False, 'error': 'pypdf not available'}), 500
         
         # Extract field values using pypdf
-        pdf_reader = PdfReader(io.BytesIO(pdf_bytes))
+        pdf_reader = PdfReader(pdf_stream)
         form_data = {}
         
         if '/AcroForm' in pdf_reader.trailer['/Root']:
@@ -5292,6 +6194,8 @@ def extract_pdf_fields():
 @require_sf_session
 def get_pdf_fields(template_id, account_id):
     """Get saved PDF field values for a template and account"""
+    conn = None
+    cur = None
     try:
         conn = get_db()
         cur = conn.cursor()
@@ -5350,8 +6254,9 @@ def get_pdf_fields(template_id, account_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
-        if 'conn' in locals():
+        if cur:
             cur.close()
+        if conn:
             conn.close()
 
 
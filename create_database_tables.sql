@@ -9,6 +9,7 @@ CREATE TABLE IF NOT EXISTS master_templates (
     storage_path VARCHAR(500),
     file_size INTEGER,
     pdf_blob BYTEA,
+    pdf_sha256 CHAR(64),
     form_fields JSONB,
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
@@ -16,6 +17,7 @@ CREATE TABLE IF NOT EXISTS master_templates (
 
 -- 2. Template Data by Account - Account-specific filled data
 ALTER TABLE master_templates ADD COLUMN IF NOT EXISTS pdf_blob BYTEA;
+ALTER TABLE master_templates ADD COLUMN IF NOT EXISTS pdf_sha256 CHAR(64);
 
 CREATE TABLE IF NOT EXISTS template_data (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -80,6 +82,8 @@ END $$;
 CREATE INDEX IF NOT EXISTS idx_template_data_account ON template_data(account_id);
 CREATE INDEX IF NOT EXISTS idx_template_data_template ON template_data(template_id);
 CREATE INDEX IF NOT EXISTS idx_master_templates_type ON master_templates(template_type);
+CREATE INDEX IF NOT EXISTS idx_master_templates_pdf_sha256 ON master_templates(pdf_sha256);
+CREATE INDEX IF NOT EXISTS idx_master_templates_form_fields_gin ON master_templates USING GIN (form_fields jsonb_path_ops);
 CREATE INDEX IF NOT EXISTS idx_generated_certificates_account ON generated_certificates(account_id);
 CREATE INDEX IF NOT EXISTS idx_certificate_holders_account ON certificate_holders(account_id);
 